@@ -1,10 +1,99 @@
 import psycopg2
-import json
+from psycopg2 import pool
+from psycopg2.extras import execute_values, Json, RealDictCursor
+import atexit
+import csv
+import io
+import orjson
 import os
+import re
+import threading
+import time
+import weakref
+import zstandard
+from contextlib import contextmanager
+from itertools import chain, islice
 from dotenv import load_dotenv
 from datetime import datetime
 
+def _jdumps(obj):
+    """Serializa para JSON com orjson (chaves não-string aceitas, como no json padrão)"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def _decode_chunk_text(row, decompressor):
+    """Substitui o texto comprimido (chunk_text_zstd) pelo texto em chunk_text, no próprio registro"""
+    packed = row.pop("chunk_text_zstd", None)
+    if packed is not None:
+        row["chunk_text"] = decompressor.decompress(packed).decode("utf-8")
+    return row
+
+# Instruções preparadas no servidor uma vez por conexão do pool.
+# As listagens trazem só as colunas exibidas; o metadata (jsonb) fica para get_doc.
+_PREPARED_SQL = {
+    "insert_doc": "INSERT INTO documents (filename, file_type, file_size, metadata, content_hash) VALUES ($1, $2, $3, $4, $5) RETURNING id",
+    "find_doc_by_hash": "SELECT id FROM documents WHERE content_hash = $1",
+    "get_doc": "SELECT id, filename, file_type, file_size, upload_date, metadata, content_hash FROM documents WHERE id = $1",
+    "get_chunks": "SELECT id, chunk_text, chunk_text_zstd, chunk_index, metadata FROM document_chunks WHERE document_id = $1 ORDER BY chunk_index",
+    "list_docs": "SELECT id, filename, file_type, file_size, upload_date FROM documents ORDER BY upload_date DESC",
+    "list_docs_page_counted": "SELECT id, filename, file_type, file_size, upload_date, count(*) OVER () AS total_count FROM documents ORDER BY upload_date DESC, id DESC LIMIT $1 OFFSET $2",
+    "count_docs": "SELECT count(*) FROM documents",
+    "insert_query": "INSERT INTO queries (query_text, document_id, result_text) VALUES ($1, $2, $3)",
+    "delete_doc": "DELETE FROM documents WHERE id = $1",
+}
+
+# DEALLOCATE + todos os PREPAREs num único comando (várias instruções, sem parâmetros)
+_PREPARE_BATCH = "DEALLOCATE ALL; " + " ".join(f"PREPARE {name} AS {sql};" for name, sql in _PREPARED_SQL.items())
+
+# Mesmas instruções com placeholders do psycopg2, usadas quando a conexão não está preparada
+_PLAIN_SQL = {name: re.sub(r"\$\d+", "%s", sql) for name, sql in _PREPARED_SQL.items()}
+
+class _CsvRowStream:
+    """Objeto de arquivo somente leitura que gera o CSV do COPY sob demanda.
+    
+    Evita montar o arquivo inteiro em memória: o COPY consome blocos de read(size)
+    e as linhas são serializadas conforme são pedidas.
+    """
+    
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        self._pending = ""
+    
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            
+            document_id, chunk_zstd, chunk_index, chunk_metadata = row
+            # bytea vai na forma hexadecimal '\x...'
+            self._writer.writerow((document_id, "\\x" + chunk_zstd.hex(), chunk_index, _jdumps(chunk_metadata)))
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        
+        if size < 0:
+            data, self._pending = self._pending, ""
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
 class DatabaseManager:
+    # A partir deste número de chunks a gravação usa um único COPY em vez de INSERT multi-VALUES
+    COPY_THRESHOLD = 500
+    
+    # Número de linhas lidas por vez do cursor em consultas potencialmente grandes
+    FETCH_BATCH_SIZE = 1000
+    
+    # Tamanho do pool. O psycopg2 fecha ao devolver toda conexão ociosa além de POOL_MIN_SIZE,
+    # então o mínimo é o número de conexões preparadas mantidas entre requisições concorrentes
+    POOL_MIN_SIZE = 5
+    POOL_MAX_SIZE = 20
+    
+    # Conexões ociosas há mais tempo que isto são testadas antes do uso (o Neon as encerra ao suspender)
+    IDLE_CHECK_SECONDS = 60
+    
     def __init__(self):
         load_dotenv()
         self.db_host = os.getenv("NEON_DB_HOST")
@@ -12,6 +101,12 @@ class DatabaseManager:
         self.db_name = os.getenv("NEON_DB_NAME")
         self.db_user = os.getenv("NEON_DB_USER")
         self.db_password = os.getenv("NEON_DB_PASSWORD")
+        # Endpoint com PgBouncer (sufixo -pooler) opcional para o pool; sem ele o pool usa NEON_DB_HOST
+        self.db_pooled_host = os.getenv("NEON_DB_POOLED_HOST") or self.db_host
+        # Host direto (sem pooler) opcional, usado no DDL e nas cargas em massa de chunks
+        self.db_direct_host = os.getenv("NEON_DB_DIRECT_HOST")
+        # O PgBouncer em modo transação não fixa a sessão: PREPARE em SQL não sobrevive entre transações
+        self.server_prepare = "-pooler" not in (self.db_pooled_host or "")
         
         
         # Flag para modo simulado
@@ -19,29 +114,145 @@ class DatabaseManager:
         
         # Inicializar armazenamento simulado para desenvolvimento
         if self.mock_mode:
-            self.mock_documents = []
-            self.mock_chunks = []
+            # Índices por ID: documentos e chunks agrupados por documento
+            self.mock_documents = {}
+            self.mock_chunks = {}
             self.mock_document_id_counter = 1
             self.mock_chunk_id_counter = 1
+        
+        # Pool de conexões criado no primeiro uso (e recriado se a criação falhar), evitando o handshake a cada chamada
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Conexões do pool já preparadas (sem pooler, com os PREPAREs)
+        self._prepared = weakref.WeakSet()
+        # Momento em que cada conexão foi devolvida ao pool
+        self._last_used = weakref.WeakKeyDictionary()
+        if not self.mock_mode:
+            atexit.register(self.close)
     
-    def connect(self):
-        """Estabelece conexão com o banco de dados PostgreSQL"""
+    def _get_pool(self):
+        """Retorna o pool, criando-o se ainda não existir; None se o banco estiver inacessível"""
+        if self._pool is not None:
+            return self._pool
+        
+        with self._pool_lock:
+            if self._pool is None:
+                try:
+                    self._pool = pool.ThreadedConnectionPool(
+                        self.POOL_MIN_SIZE, self.POOL_MAX_SIZE,
+                        host=self.db_pooled_host,
+                        port=self.db_port,
+                        dbname=self.db_name,
+                        user=self.db_user,
+                        password=self.db_password
+                    )
+                except Exception as e:
+                    # Sem pool em cache: a próxima chamada tenta de novo
+                    print(f"Erro ao conectar ao banco de dados: {e}")
+        return self._pool
+    
+    def _checkout(self, conn_pool):
+        """Obtém do pool uma conexão viva e preparada; descarta conexões encerradas pelo servidor"""
+        for attempt in range(2):
+            conn = conn_pool.getconn()
+            try:
+                # Conexão ociosa há muito tempo: testar antes de usar
+                idle_since = self._last_used.get(conn)
+                if idle_since is not None and time.monotonic() - idle_since > self.IDLE_CHECK_SECONDS:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    conn.rollback()
+                
+                if conn not in self._prepared:
+                    self._prepare(conn)
+                return conn
+            except Exception as e:
+                print(f"Conexão do pool inválida, descartando: {e}")
+                conn_pool.putconn(conn, close=True)
+        return None
+    
+    @contextmanager
+    def _conn(self):
+        """Empresta uma conexão do pool e a devolve ao final do bloco"""
         if self.mock_mode:
             print("Usando conexão simulada para desenvolvimento")
-            return None
+            yield None
+            return
+        
+        conn_pool = self._get_pool()
+        if conn_pool is None:
+            yield None
+            return
+        
+        try:
+            conn = self._checkout(conn_pool)
+        except Exception as e:
+            print(f"Erro ao obter conexão do pool: {e}")
+            conn = None
+        
+        if conn is None:
+            yield None
+            return
+        
+        try:
+            yield conn
+        finally:
+            # putconn faz rollback de transações pendentes; conexões quebradas são fechadas em vez de reaproveitadas
+            self._last_used[conn] = time.monotonic()
+            conn_pool.putconn(conn, close=bool(conn.closed))
+    
+    @contextmanager
+    def _bulk_conn(self):
+        """Conexão dedicada ao host direto para DDL e cargas em massa; sem host direto, usa o pool"""
+        if not self.db_direct_host or self.db_direct_host == self.db_pooled_host:
+            with self._conn() as conn:
+                yield conn
+            return
         
         try:
             conn = psycopg2.connect(
-                host=self.db_host,
+                host=self.db_direct_host,
                 port=self.db_port,
                 dbname=self.db_name,
                 user=self.db_user,
                 password=self.db_password
             )
-            return conn
         except Exception as e:
-            print(f"Erro ao conectar ao banco de dados: {e}")
-            return None
+            print(f"Erro ao conectar ao banco de dados (host direto): {e}")
+            yield None
+            return
+        
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def _prepare(self, conn):
+        """Prepara a sessão da conexão: instruções frequentes"""
+        try:
+            if self.server_prepare:
+                with conn.cursor() as cursor:
+                    # Partir de uma sessão limpa para que o PREPARE seja idempotente;
+                    # tudo vai numa única ida ao servidor
+                    cursor.execute(_PREPARE_BATCH)
+            conn.commit()
+            self._prepared.add(conn)
+        except Exception:
+            # Ex.: extensão ou tabelas ainda não criadas; tenta de novo no próximo checkout
+            conn.rollback()
+    
+    def _execute(self, conn, cursor, name, params=()):
+        """Executa uma instrução preparada, ou o SQL equivalente se a conexão não estiver preparada"""
+        if self.server_prepare and conn in self._prepared:
+            args = f" ({', '.join(['%s'] * len(params))})" if params else ""
+            cursor.execute(f"EXECUTE {name}{args}", params)
+        else:
+            cursor.execute(_PLAIN_SQL[name], params)
+    
+    def close(self):
+        """Fecha todas as conexões do pool"""
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
     
     def initialize_database(self):
         """Cria as tabelas necessárias no banco de dados"""
@@ -49,60 +260,102 @@ class DatabaseManager:
             print("Simulando inicialização do banco de dados")
             return True
         
-        conn = self.connect()
-        if not conn:
-            return False
-        
-        try:
-            cursor = conn.cursor()
-            
-            
-            # Tabela para documentos
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id SERIAL PRIMARY KEY,
-                filename TEXT NOT NULL,
-                file_type TEXT NOT NULL,
-                file_size INTEGER,
-                upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                metadata JSONB
-            )
-            """)
-            
-            # Tabela para chunks de documentos
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS document_chunks (
-                id SERIAL PRIMARY KEY,
-                document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
-                chunk_text TEXT NOT NULL,
-                chunk_index INTEGER NOT NULL,
-                embedding VECTOR(1536),
-                metadata JSONB
-            )
-            """)
-            
-            # Tabela para consultas
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS queries (
-                id SERIAL PRIMARY KEY,
-                query_text TEXT NOT NULL,
-                document_id INTEGER REFERENCES documents(id),
-                result_text TEXT,
-                query_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Erro ao inicializar banco de dados: {e}")
-            if conn:
-                conn.close()
-            return False
+        # DDL pelo host direto: o pooler em modo transação rejeita parte das instruções de sessão
+        with self._bulk_conn() as conn:
+            if not conn:
+                return False
+            
+            try:
+                with conn.cursor() as cursor:
+                    # Extensão pgvector, necessária para a coluna de embeddings
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                    
+                    # Tabela para documentos
+                    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS documents (
+                        id SERIAL PRIMARY KEY,
+                        filename TEXT NOT NULL,
+                        file_type TEXT NOT NULL,
+                        file_size INTEGER,
+                        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        metadata JSONB,
+                        content_hash TEXT
+                    )
+                    """)
+                    
+                    # Tabela para chunks de documentos
+                    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS document_chunks (
+                        id SERIAL PRIMARY KEY,
+                        document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                        chunk_text TEXT,
+                        chunk_text_zstd BYTEA,
+                        chunk_index INTEGER NOT NULL,
+                        embedding VECTOR(1536),
+                        metadata JSONB
+                    )
+                    """)
+                    
+                    # Migrações de bancos criados antes destas colunas. ALTER TABLE pega ACCESS EXCLUSIVE
+                    # mesmo sem mudar nada (inclusive com IF NOT EXISTS): consultar o catálogo antes
+                    cursor.execute("""
+                    SELECT attrelid::regclass::text, attname, attnotnull, attstorage FROM pg_attribute
+                    WHERE attrelid IN ('documents'::regclass, 'document_chunks'::regclass)
+                      AND attname IN ('content_hash', 'chunk_text', 'chunk_text_zstd') AND NOT attisdropped
+                    """)
+                    columns = {
+                        (table, name): (not_null, storage)
+                        for table, name, not_null, storage in cursor.fetchall()
+                    }
+                    
+                    if ("documents", "content_hash") not in columns:
+                        cursor.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+                    
+                    # Texto dos chunks novos vai comprimido com zstd; chunk_text fica só para linhas antigas
+                    if ("document_chunks", "chunk_text_zstd") not in columns:
+                        cursor.execute("ALTER TABLE document_chunks ADD COLUMN chunk_text_zstd BYTEA")
+                    if columns.get(("document_chunks", "chunk_text"), (False, None))[0]:
+                        cursor.execute("ALTER TABLE document_chunks ALTER COLUMN chunk_text DROP NOT NULL")
+                    # Dados já comprimidos: TOAST fora da linha, sem tentar comprimir de novo
+                    if columns.get(("document_chunks", "chunk_text_zstd"), (False, None))[1] != "e":
+                        cursor.execute("ALTER TABLE document_chunks ALTER COLUMN chunk_text_zstd SET STORAGE EXTERNAL")
+                    
+                    # Tabela para consultas
+                    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS queries (
+                        id SERIAL PRIMARY KEY,
+                        query_text TEXT NOT NULL,
+                        document_id INTEGER REFERENCES documents(id),
+                        result_text TEXT,
+                        query_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """)
+                    
+                    # Índices para os caminhos de leitura mais frequentes
+                    cursor.execute(
+                        "CREATE INDEX IF NOT EXISTS document_chunks_docid_idx ON document_chunks (document_id, chunk_index)"
+                    )
+                    cursor.execute(
+                        "CREATE INDEX IF NOT EXISTS documents_upload_date_idx ON documents (upload_date DESC)"
+                    )
+                    cursor.execute(
+                        "CREATE UNIQUE INDEX IF NOT EXISTS documents_content_hash_idx ON documents (content_hash)"
+                    )
+                    cursor.execute(
+                        "CREATE INDEX IF NOT EXISTS queries_document_id_idx ON queries (document_id)"
+                    )
+                    
+                    # A busca por similaridade é feita no Chroma: a coluna embedding fica sempre NULL e
+                    # não precisa de índice vetorial (removido de bancos criados com ele)
+                    cursor.execute("DROP INDEX IF EXISTS chunk_embed_idx")
+                
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Erro ao inicializar banco de dados: {e}")
+                return False
     
-    def store_document(self, filename, file_type, file_size, metadata=None):
+    def store_document(self, filename, file_type, file_size, metadata=None, content_hash=None):
         """Armazena metadados do documento no banco de dados"""
         if self.mock_mode:
             doc_id = self.mock_document_id_counter
@@ -114,212 +367,284 @@ class DatabaseManager:
                 "file_type": file_type,
                 "file_size": file_size,
                 "upload_date": datetime.now().isoformat(),
-                "metadata": metadata or {}
+                "metadata": metadata or {},
+                "content_hash": content_hash
             }
             
-            self.mock_documents.append(doc)
+            self.mock_documents[doc_id] = doc
             print(f"Documento simulado armazenado com ID: {doc_id}")
             return doc_id
         
-        conn = self.connect()
-        if not conn:
-            return None
-        
-        try:
-            cursor = conn.cursor()
-            
-            metadata_json = json.dumps(metadata) if metadata else '{}'
-            
-            cursor.execute(
-                "INSERT INTO documents (filename, file_type, file_size, metadata) VALUES (%s, %s, %s, %s) RETURNING id",
-                (filename, file_type, file_size, metadata_json)
-            )
-            
-            document_id = cursor.fetchone()[0]
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+        with self._conn() as conn:
+            if not conn:
+                return None
             
-            return document_id
-        except Exception as e:
-            print(f"Erro ao armazenar documento: {e}")
-            if conn:
-                conn.close()
-            return None
+            try:
+                with conn.cursor() as cursor:
+                    document_id = self._insert_document(conn, cursor, filename, file_type, file_size, metadata, content_hash)
+                
+                conn.commit()
+                return document_id
+            except Exception as e:
+                print(f"Erro ao armazenar documento: {e}")
+                return None
     
-    def store_document_chunks(self, document_id, chunks, embeddings=None):
-        """Armazena chunks de documento no banco de dados"""
+    def store_document_chunks(self, document_id, chunks):
+        """Armazena chunks de documento no banco de dados (aceita lista ou gerador de chunks)"""
         if self.mock_mode:
-            for i, chunk in enumerate(chunks):
+            document_chunks = self.mock_chunks.setdefault(document_id, [])
+            stored_count = 0
+            for _, chunk_text, i, chunk_metadata in self._iter_chunk_rows(document_id, chunks):
                 chunk_id = self.mock_chunk_id_counter
                 self.mock_chunk_id_counter += 1
                 
                 chunk_data = {
                     "id": chunk_id,
                     "document_id": document_id,
-                    "chunk_text": chunk.page_content if hasattr(chunk, 'page_content') else str(chunk),
+                    "chunk_text": chunk_text,
                     "chunk_index": i,
-                    "metadata": chunk.metadata if hasattr(chunk, 'metadata') else {}
+                    "metadata": chunk_metadata
                 }
                 
-                self.mock_chunks.append(chunk_data)
+                document_chunks.append(chunk_data)
+                stored_count += 1
             
-            print(f"Armazenados {len(chunks)} chunks simulados para o documento {document_id}")
+            print(f"Armazenados {stored_count} chunks simulados para o documento {document_id}")
             return True
         
-        conn = self.connect()
-        if not conn:
-            return False
-        
-        try:
-            cursor = conn.cursor()
+        with self._bulk_conn() as conn:
+            if not conn:
+                return False
             
-            for i, chunk in enumerate(chunks):
-                chunk_text = chunk.page_content if hasattr(chunk, 'page_content') else str(chunk)
-                chunk_metadata = json.dumps(chunk.metadata) if hasattr(chunk, 'metadata') else '{}'
+            try:
+                with conn.cursor() as cursor:
+                    self._insert_chunks(cursor, document_id, chunks)
                 
-                # Se embeddings estiverem disponíveis, armazená-los
-                if embeddings and i < len(embeddings):
-                    cursor.execute(
-                        "INSERT INTO document_chunks (document_id, chunk_text, chunk_index, embedding, metadata) VALUES (%s, %s, %s, %s, %s)",
-                        (document_id, chunk_text, i, embeddings[i], chunk_metadata)
-                    )
-                else:
-                    cursor.execute(
-                        "INSERT INTO document_chunks (document_id, chunk_text, chunk_index, metadata) VALUES (%s, %s, %s, %s)",
-                        (document_id, chunk_text, i, chunk_metadata)
-                    )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Erro ao armazenar chunks: {e}")
+                return False
+    
+    def ingest(self, filename, file_type, file_size, chunks, metadata=None, content_hash=None):
+        """Armazena o documento e seus chunks numa única transação e retorna o ID do documento"""
+        if self.mock_mode:
+            doc_id = self.store_document(filename, file_type, file_size, metadata, content_hash)
+            self.store_document_chunks(doc_id, chunks)
+            return doc_id
+        
+        with self._bulk_conn() as conn:
+            if not conn:
+                return None
             
-            return True
-        except Exception as e:
-            print(f"Erro ao armazenar chunks: {e}")
-            if conn:
-                conn.close()
-            return False
+            try:
+                with conn.cursor() as cursor:
+                    document_id = self._insert_document(conn, cursor, filename, file_type, file_size, metadata, content_hash)
+                    self._insert_chunks(cursor, document_id, chunks)
+                
+                # Um único commit (e fsync) para documento e chunks
+                conn.commit()
+                return document_id
+            except Exception as e:
+                print(f"Erro ao armazenar documento: {e}")
+                return None
+    
+    def _insert_document(self, conn, cursor, filename, file_type, file_size, metadata, content_hash=None):
+        """Insere a linha do documento na transação corrente e retorna seu ID"""
+        metadata_json = Json(metadata or {}, dumps=_jdumps)
+        self._execute(conn, cursor, "insert_doc", (filename, file_type, file_size, metadata_json, content_hash))
+        return cursor.fetchone()[0]
+    
+    def _insert_chunks(self, cursor, document_id, chunks):
+        """Insere os chunks na transação corrente, com o texto comprimido em zstd"""
+        # Compressor por chamada: instâncias do zstandard não são seguras entre threads
+        compressor = zstandard.ZstdCompressor(level=3)
+        rows = (
+            (doc_id, compressor.compress(text.encode("utf-8")), idx, meta)
+            for doc_id, text, idx, meta in self._iter_chunk_rows(document_id, chunks)
+        )
+        
+        # Espiar o primeiro lote para decidir o caminho de inserção
+        head = list(islice(rows, self.COPY_THRESHOLD))
+        if not head:
+            return
+        
+        if len(head) < self.COPY_THRESHOLD:
+            # Documentos pequenos: uma única instrução multi-VALUES em vez de um INSERT por chunk
+            execute_values(
+                cursor,
+                "INSERT INTO document_chunks (document_id, chunk_text_zstd, chunk_index, metadata) VALUES %s",
+                [(doc_id, packed, idx, Json(meta, dumps=_jdumps)) for doc_id, packed, idx, meta in head],
+                page_size=500
+            )
+        else:
+            # Documentos grandes: um único COPY para todas as linhas, gerado sob demanda
+            self._copy_chunks(cursor, chain(head, rows))
+    
+    def _iter_chunk_rows(self, document_id, chunks):
+        """Converte chunks em linhas da tabela"""
+        iterator = iter(chunks)
+        first = next(iterator, None)
+        if first is None:
+            return
+        
+        # Os chunks de uma coleção têm todos o mesmo tipo: verificar os atributos uma única vez
+        has_content = hasattr(first, 'page_content')
+        has_metadata = hasattr(first, 'metadata')
+        
+        for i, chunk in enumerate(chain((first,), iterator)):
+            chunk_text = chunk.page_content if has_content else str(chunk)
+            chunk_metadata = chunk.metadata if has_metadata else {}
+            yield (document_id, chunk_text, i, chunk_metadata)
+    
+    def _copy_chunks(self, cursor, rows):
+        """Envia as linhas de chunks via COPY FROM STDIN em formato CSV"""
+        cursor.copy_expert(
+            "COPY document_chunks (document_id, chunk_text_zstd, chunk_index, metadata) FROM STDIN WITH (FORMAT csv)",
+            _CsvRowStream(rows),
+            size=64 * 1024
+        )
     
     def get_document(self, document_id):
         """Recupera informações de um documento específico"""
         if self.mock_mode:
-            for doc in self.mock_documents:
-                if doc["id"] == document_id:
-                    return doc
-            return None
+            return self.mock_documents.get(document_id)
         
-        conn = self.connect()
-        if not conn:
+        with self._conn() as conn:
+            if not conn:
+                return None
+            
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    self._execute(conn, cursor, "get_doc", (document_id,))
+                    
+                    return cursor.fetchone()
+            except Exception as e:
+                print(f"Erro ao recuperar documento: {e}")
+                return None
+    
+    def find_document_by_hash(self, content_hash):
+        """Retorna o ID do documento com o mesmo conteúdo, ou None se ainda não foi armazenado"""
+        if self.mock_mode:
+            for doc in self.mock_documents.values():
+                if doc.get("content_hash") == content_hash:
+                    return doc["id"]
             return None
         
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "SELECT id, filename, file_type, file_size, upload_date, metadata FROM documents WHERE id = %s",
-                (document_id,)
-            )
-            
-            result = cursor.fetchone()
-            
-            cursor.close()
-            conn.close()
+        with self._conn() as conn:
+            if not conn:
+                return None
             
-            if result:
-                return {
-                    "id": result[0],
-                    "filename": result[1],
-                    "file_type": result[2],
-                    "file_size": result[3],
-                    "upload_date": result[4],
-                    "metadata": result[5]
-                }
-            else:
+            try:
+                with conn.cursor() as cursor:
+                    self._execute(conn, cursor, "find_doc_by_hash", (content_hash,))
+                    row = cursor.fetchone()
+                    return row[0] if row else None
+            except Exception as e:
+                print(f"Erro ao buscar documento por hash: {e}")
                 return None
-        except Exception as e:
-            print(f"Erro ao recuperar documento: {e}")
-            if conn:
-                conn.close()
-            return None
     
     def get_document_chunks(self, document_id):
-        """Recupera chunks de um documento específico"""
+        """Recupera chunks de um documento específico (None em caso de falha, [] se não houver chunks)"""
         if self.mock_mode:
-            return [chunk for chunk in self.mock_chunks if chunk["document_id"] == document_id]
+            return self.mock_chunks.get(document_id, [])
         
-        conn = self.connect()
-        if not conn:
-            return []
-        
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "SELECT id, chunk_text, chunk_index, metadata FROM document_chunks WHERE document_id = %s ORDER BY chunk_index",
-                (document_id,)
-            )
-            
-            results = cursor.fetchall()
-            
-            cursor.close()
-            conn.close()
+        with self._conn() as conn:
+            if not conn:
+                return None
             
-            chunks = []
-            for result in results:
-                chunks.append({
-                    "id": result[0],
-                    "chunk_text": result[1],
-                    "chunk_index": result[2],
-                    "metadata": result[3]
-                })
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    self._execute(conn, cursor, "get_chunks", (document_id,))
+                    
+                    # Linhas já chegam como dicionários; ler em lotes limita a memória do driver
+                    decompressor = zstandard.ZstdDecompressor()
+                    chunks = []
+                    for batch in iter(lambda: cursor.fetchmany(self.FETCH_BATCH_SIZE), []):
+                        chunks.extend(_decode_chunk_text(row, decompressor) for row in batch)
+                
+                return chunks
+            except Exception as e:
+                print(f"Erro ao recuperar chunks: {e}")
+                return None
+    
+    def get_all_chunks_with_docinfo(self):
+        """Recupera os chunks de todos os documentos, com ID e nome do documento, numa única consulta (None em caso de falha)"""
+        if self.mock_mode:
+            return [
+                {**chunk, "document_name": self.mock_documents[doc_id]["filename"]}
+                for doc_id, chunks in self.mock_chunks.items() if doc_id in self.mock_documents
+                for chunk in chunks
+            ]
+        
+        with self._conn() as conn:
+            if not conn:
+                return None
             
-            return chunks
-        except Exception as e:
-            print(f"Erro ao recuperar chunks: {e}")
-            if conn:
-                conn.close()
-            return []
+            try:
+                # Cursor nomeado (server-side): o driver busca as linhas em lotes de itersize
+                with conn.cursor(name="all_chunks_with_docinfo", cursor_factory=RealDictCursor) as cursor:
+                    cursor.itersize = 10000
+                    cursor.execute(
+                        "SELECT c.id, c.chunk_text, c.chunk_text_zstd, c.chunk_index, c.metadata, "
+                        "d.id AS document_id, d.filename AS document_name "
+                        "FROM document_chunks c JOIN documents d ON c.document_id = d.id "
+                        "ORDER BY d.id, c.chunk_index"
+                    )
+                    
+                    decompressor = zstandard.ZstdDecompressor()
+                    return [_decode_chunk_text(row, decompressor) for row in cursor]
+            except Exception as e:
+                print(f"Erro ao recuperar chunks: {e}")
+                return None
     
     def list_documents(self):
-        """Lista todos os documentos armazenados"""
+        """Lista todos os documentos armazenados, sem o metadata"""
         if self.mock_mode:
-            return self.mock_documents
+            return list(self.mock_documents.values())
         
-        conn = self.connect()
-        if not conn:
-            return []
+        with self._conn() as conn:
+            if not conn:
+                return []
+            
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    self._execute(conn, cursor, "list_docs")
+                    
+                    # Linhas já chegam como dicionários, sem uma segunda passada em Python
+                    return cursor.fetchall()
+            except Exception as e:
+                print(f"Erro ao listar documentos: {e}")
+                return []
+    
+    def list_documents_page(self, limit, offset=0):
+        """Retorna (documentos da página, total de documentos) numa única ida ao banco"""
+        if self.mock_mode:
+            documents = list(self.mock_documents.values())
+            return documents[offset:offset + limit], len(documents)
         
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "SELECT id, filename, file_type, file_size, upload_date, metadata FROM documents ORDER BY upload_date DESC"
-            )
-            
-            results = cursor.fetchall()
-            
-            cursor.close()
-            conn.close()
-            
-            documents = []
-            for result in results:
-                documents.append({
-                    "id": result[0],
-                    "filename": result[1],
-                    "file_type": result[2],
-                    "file_size": result[3],
-                    "upload_date": result[4],
-                    "metadata": result[5]
-                })
-            
-            return documents
-        except Exception as e:
-            print(f"Erro ao listar documentos: {e}")
-            if conn:
-                conn.close()
-            return []
+        with self._conn() as conn:
+            if not conn:
+                return [], 0
+            
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    # count(*) OVER () traz o total em cada linha da página, sem um segundo SELECT
+                    self._execute(conn, cursor, "list_docs_page_counted", (limit, offset))
+                    documents = cursor.fetchall()
+                    
+                    if documents:
+                        total = documents[0]["total_count"]
+                        for doc in documents:
+                            del doc["total_count"]
+                        return documents, total
+                    
+                    # Página vazia (tabela vazia ou offset além do fim): o total exige uma consulta própria
+                    self._execute(conn, cursor, "count_docs")
+                    return [], cursor.fetchone()["count"]
+            except Exception as e:
+                print(f"Erro ao listar documentos: {e}")
+                return [], 0
     
     def store_query(self, query_text, document_id, result_text):
     # """Armazena uma consulta e seu resultado"""
@@ -328,55 +653,40 @@ class DatabaseManager:
             print(f"Simulando armazenamento de consulta: '{query_text}' {document_info}")
             return True
         
-        conn = self.connect()
-        if not conn:
-            return False
-        
-        try:
-            cursor = conn.cursor()
-            
-            # Modificado para aceitar document_id como NULL para consultas globais
-            cursor.execute(
-                "INSERT INTO queries (query_text, document_id, result_text) VALUES (%s, %s, %s)",
-                (query_text, document_id, result_text)
-            )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return True
-        except Exception as e:
-            print(f"Erro ao armazenar consulta: {e}")
-            if conn:
-                conn.close()
-            return False
+        with self._conn() as conn:
+            if not conn:
+                return False
+            
+            try:
+                with conn.cursor() as cursor:
+                    # Modificado para aceitar document_id como NULL para consultas globais
+                    self._execute(conn, cursor, "insert_query", (query_text, document_id, result_text))
+                
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Erro ao armazenar consulta: {e}")
+                return False
     
     def delete_document(self, document_id):
         """Exclui um documento e seus chunks"""
         if self.mock_mode:
-            self.mock_documents = [doc for doc in self.mock_documents if doc["id"] != document_id]
-            self.mock_chunks = [chunk for chunk in self.mock_chunks if chunk["document_id"] != document_id]
+            self.mock_documents.pop(document_id, None)
+            self.mock_chunks.pop(document_id, None)
             print(f"Documento simulado {document_id} excluído")
             return True
         
-        conn = self.connect()
-        if not conn:
-            return False
-        
-        try:
-            cursor = conn.cursor()
-            
-            # A exclusão em cascata dos chunks é tratada pela restrição ON DELETE CASCADE
-            cursor.execute("DELETE FROM documents WHERE id = %s", (document_id,))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return True
-        except Exception as e:
-            print(f"Erro ao excluir documento: {e}")
-            if conn:
-                conn.close()
-            return False
+        with self._conn() as conn:
+            if not conn:
+                return False
+            
+            try:
+                with conn.cursor() as cursor:
+                    # A exclusão em cascata dos chunks é tratada pela restrição ON DELETE CASCADE
+                    self._execute(conn, cursor, "delete_doc", (document_id,))
+                
+                conn.commit()
+                return True
+            except Exception as e:
+                print(f"Erro ao excluir documento: {e}")
+                return False
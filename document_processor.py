@@ -1,13 +1,14 @@
 import os
-from langchain.document_loaders import TextLoader, CSVLoader, PyPDFLoader
-from langchain.document_loaders.excel import UnstructuredExcelLoader  # Para arquivos Excel
-from langchain.document_loaders.unstructured import UnstructuredFileLoader  # Para formatos genéricos
-from langchain.document_loaders.json_loader import JSONLoader  # Para arquivos JSON
-from langchain.document_loaders.html import UnstructuredHTMLLoader  # Para arquivos HTML
-from langchain.document_loaders.xml import UnstructuredXMLLoader  # Para arquivos XML
-from langchain.document_loaders.email import UnstructuredEmailLoader  # Para emails
-from langchain.document_loaders.word_document import UnstructuredWordDocumentLoader  # Para documentos Word
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import csv
+import io
+import hashlib
+import mmap
+import pickle
+import shutil
+import tempfile
+from functools import cached_property
+from langchain.document_loaders import TextLoader, PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter, HTMLHeaderTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_groq import ChatGroq
@@ -16,21 +17,417 @@ from langchain.schema.retriever import BaseRetriever
 from langchain.schema import Document
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
-import json
+import orjson
 import requests
 from langchain_community.vectorstores.utils import filter_complex_metadata
 
+# Modelos de embedding carregados uma única vez por processo, indexados pelo nome
+_MODEL_CACHE = {}
+
+def _get_embedding_model(model_name):
+    """Retorna o modelo de embeddings em cache, carregando-o apenas na primeira chamada"""
+    if model_name not in _MODEL_CACHE:
+        _MODEL_CACHE[model_name] = HuggingFaceEmbeddings(
+            model_name=model_name,
+            # Codificar em lotes; vetores normalizados permitem similaridade por produto interno
+            encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
+        )
+    return _MODEL_CACHE[model_name]
+
+def _csv_line(writer, buffer, row):
+    """Serializa uma linha em CSV reaproveitando o mesmo buffer"""
+    writer.writerow(row)
+    line = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return line
+
+def _table_documents(header, rows, metadata, chunk_size):
+    """Agrupa linhas de uma tabela em Documents de até chunk_size caracteres.
+    
+    Cada Document começa com a linha de cabeçalho, para que todo chunk traga os nomes das colunas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    header_line = _csv_line(writer, buffer, header)
+    
+    lines = []
+    size = len(header_line)
+    first_row = 0
+    for i, row in enumerate(rows):
+        line = _csv_line(writer, buffer, row)
+        if lines and size + len(line) > chunk_size:
+            yield Document(page_content=header_line + "".join(lines), metadata={**metadata, "row": first_row})
+            lines = []
+            size = len(header_line)
+            first_row = i
+        lines.append(line)
+        size += len(line)
+    
+    if lines:
+        yield Document(page_content=header_line + "".join(lines), metadata={**metadata, "row": first_row})
+
+class ArrowCSVLoader:
+    """Carrega CSVs com o leitor em C++ do pyarrow, agrupando linhas em Documents.
+    
+    Todas as colunas são lidas como texto: sem inferência de tipos, o conteúdo é preservado
+    (zeros à esquerda, formato de datas e números). Cada Document repete o cabeçalho.
+    """
+    
+    def __init__(self, file_path, chunk_size=1000, source=None):
+        # file_path pode ser um caminho ou um objeto de arquivo (ex.: BytesIO)
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.source = source or file_path
+    
+    def _read_header(self):
+        """Lê apenas a linha de cabeçalho, para declarar todas as colunas como texto"""
+        if hasattr(self.file_path, "read"):
+            self.file_path.seek(0)
+            text = io.TextIOWrapper(self.file_path, encoding="utf-8-sig", newline="")
+            try:
+                return next(csv.reader(text), [])
+            finally:
+                # Desacoplar para que o wrapper não feche o arquivo do chamador
+                text.detach()
+                self.file_path.seek(0)
+        
+        with open(self.file_path, encoding="utf-8-sig", newline="") as f:
+            return next(csv.reader(f), [])
+    
+    def _iter_rows(self, header):
+        # Importado só quando um CSV é lido, como os demais loaders específicos de formato
+        import pyarrow as pa
+        import pyarrow.csv as pv
+        
+        convert_options = pv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        )
+        # Leitura em blocos: as linhas são entregues sem carregar o arquivo inteiro
+        reader = pv.open_csv(self.file_path, convert_options=convert_options)
+        for batch in reader:
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+    
+    def lazy_load(self):
+        header = self._read_header()
+        if not header:
+            return
+        
+        yield from _table_documents(header, self._iter_rows(header), {"source": self.source}, self.chunk_size)
+    
+    def load(self):
+        return list(self.lazy_load())
+
+def _file_hash(file_path):
+    """Calcula o SHA-256 do conteúdo do arquivo (o mesmo hash de documents.content_hash) sem laço de leitura em Python"""
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+: leitura e hash feitos em C
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        
+        # Versões anteriores: mapear o arquivo e hashear o buffer inteiro de uma vez
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+# Fábricas de loaders: os loaders do unstructured só são importados quando o formato é usado
+
+def _generic_loader(file_path):
+    # Loader genérico para formatos sem loader específico
+    from langchain.document_loaders.unstructured import UnstructuredFileLoader
+    return UnstructuredFileLoader(file_path)
+
+def _excel_loader(file_path):
+    from langchain.document_loaders.excel import UnstructuredExcelLoader
+    return UnstructuredExcelLoader(file_path, mode="elements")
+
+def _word_loader(file_path):
+    from langchain.document_loaders.word_document import UnstructuredWordDocumentLoader
+    return UnstructuredWordDocumentLoader(file_path)
+
+def _json_loader(file_path):
+    from langchain.document_loaders.json_loader import JSONLoader
+    
+    # Definir uma função para extrair o conteúdo de cada item do JSON
+    def metadata_func(record, metadata):
+        metadata["content"] = record.get("content", "")
+        return metadata
+    
+    return JSONLoader(
+        file_path=file_path,
+        jq_schema='.[]',  # Ajuste conforme a estrutura do seu JSON
+        content_key="content",  # Chave que contém o texto principal
+        metadata_func=metadata_func
+    )
+
+def _html_loader(file_path):
+    from langchain.document_loaders.html import UnstructuredHTMLLoader
+    return UnstructuredHTMLLoader(file_path)
+
+def _xml_loader(file_path):
+    from langchain.document_loaders.xml import UnstructuredXMLLoader
+    return UnstructuredXMLLoader(file_path)
+
+def _email_loader(file_path):
+    from langchain.document_loaders.email import UnstructuredEmailLoader
+    return UnstructuredEmailLoader(file_path)
+
+# Tabela de despacho por extensão
+_LOADERS = {
+    '.txt': TextLoader,
+    '.md': TextLoader,
+    # Leitura vetorizada via pyarrow em vez de um Document por linha
+    '.csv': ArrowCSVLoader,
+    '.pdf': PyPDFLoader,
+    '.xlsx': _excel_loader,
+    '.xls': _excel_loader,
+    '.docx': _word_loader,
+    '.doc': _word_loader,
+    '.json': _json_loader,
+    '.html': _html_loader,
+    '.htm': _html_loader,
+    '.xml': _xml_loader,
+    '.eml': _email_loader,
+    '.msg': _email_loader,
+}
+
+# Loaders para formatos que podem ser lidos direto de um objeto de arquivo, sem caminho no disco
+
+def _text_from_stream(stream):
+    return [Document(page_content=stream.read().decode("utf-8"), metadata={"source": "upload"})]
+
+def _csv_from_stream(stream):
+    return ArrowCSVLoader(stream, source="upload").load()
+
+def _pdf_from_stream(stream):
+    from pypdf import PdfReader
+    
+    # Um Document por página, com os mesmos metadados do PyPDFLoader, extraído sob demanda:
+    # cada página é dividida antes da seguinte ser lida
+    reader = PdfReader(stream)
+    for i, page in enumerate(reader.pages):
+        yield Document(page_content=page.extract_text() or "", metadata={"source": "upload", "page": i})
+
+def _excel_from_stream(stream):
+    import pandas as pd
+    
+    # Todas as abas (sheet_name=None), como texto; cada Document repete o cabeçalho da aba
+    sheets = pd.read_excel(stream, sheet_name=None, dtype=str, keep_default_na=False)
+    documents = []
+    for name, df in sheets.items():
+        documents.extend(_table_documents(
+            [str(column) for column in df.columns], df.itertuples(index=False, name=None),
+            {"source": "upload", "sheet": name}, 1000
+        ))
+    return documents
+
+def _docx_blocks(parent, element):
+    """Texto de parágrafos e tabelas na ordem do documento; as células de cada linha são unidas por " | "."""
+    from docx.oxml.ns import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    
+    for child in element.iterchildren():
+        if child.tag == qn("w:p"):
+            yield Paragraph(child, parent).text
+        elif child.tag == qn("w:tbl"):
+            for row in Table(child, parent).rows:
+                cells = []
+                seen = set()
+                for cell in row.cells:
+                    # Células mescladas aparecem repetidas em row.cells
+                    if cell._tc in seen:
+                        continue
+                    seen.add(cell._tc)
+                    cells.append(cell.text)
+                yield " | ".join(cells)
+
+def _docx_from_stream(stream):
+    import docx
+    
+    document = docx.Document(stream)
+    
+    def section_parts(attribute):
+        # Seções que herdam o cabeçalho/rodapé da anterior não têm conteúdo próprio
+        for section in document.sections:
+            part = getattr(section, attribute)
+            if not part.is_linked_to_previous:
+                yield from _docx_blocks(part, part._element)
+    
+    lines = [*section_parts("header"), *_docx_blocks(document, document.element.body), *section_parts("footer")]
+    
+    text = "\n".join(line for line in lines if line)
+    return [Document(page_content=text, metadata={"source": "upload"})]
+
+# Cabeçalhos que delimitam seções; o texto de cada nível vai para os metadados h1..h3
+_MARKDOWN_HEADERS = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+_HTML_HEADERS = [("h1", "h1"), ("h2", "h2"), ("h3", "h3")]
+
+def _with_section_path(sections):
+    """Marca cada seção com a origem e o caminho de cabeçalhos (ex.: "Intro > Instalação")"""
+    for doc in sections:
+        doc.metadata["source"] = "upload"
+        doc.metadata["section_path"] = " > ".join(
+            doc.metadata[level] for level in ("h1", "h2", "h3") if level in doc.metadata
+        )
+    return sections
+
+def _markdown_from_stream(stream):
+    splitter = MarkdownHeaderTextSplitter(headers_to_split_on=_MARKDOWN_HEADERS, strip_headers=False)
+    return _with_section_path(splitter.split_text(stream.read().decode("utf-8")))
+
+def _fold_headers(sections):
+    """Junta os Documents que só contêm um cabeçalho ao início da seção seguinte.
+    
+    O HTMLHeaderTextSplitter devolve cada cabeçalho como um Document próprio; assim as seções
+    ficam com o mesmo formato do Markdown (strip_headers=False), com o cabeçalho no conteúdo.
+    """
+    folded = []
+    pending = []
+    for doc in sections:
+        levels = [doc.metadata[level] for level in ("h1", "h2", "h3") if level in doc.metadata]
+        if levels and doc.page_content.strip() == levels[-1]:
+            pending.append(doc)
+            continue
+        
+        if pending:
+            doc.page_content = "\n".join(header.page_content for header in pending) + "\n" + doc.page_content
+            pending = []
+        folded.append(doc)
+    
+    # Cabeçalhos no fim do documento, sem seção depois deles
+    if pending:
+        pending[-1].page_content = "\n".join(header.page_content for header in pending)
+        folded.append(pending[-1])
+    return folded
+
+def _html_from_stream(stream):
+    # Dividir pelos cabeçalhos do HTML antes de perder a estrutura ao extrair o texto
+    splitter = HTMLHeaderTextSplitter(headers_to_split_on=_HTML_HEADERS)
+    sections = splitter.split_text(stream.read().decode("utf-8", errors="replace"))
+    return _with_section_path(_fold_headers(sections))
+
+_STREAM_LOADERS = {
+    '.txt': _text_from_stream,
+    '.md': _markdown_from_stream,
+    '.csv': _csv_from_stream,
+    '.pdf': _pdf_from_stream,
+    '.xlsx': _excel_from_stream,
+    '.docx': _docx_from_stream,
+    '.html': _html_from_stream,
+    '.htm': _html_from_stream,
+}
+
+# Vetor simulado compartilhado por todos os embeddings de desenvolvimento (tratado como somente leitura)
+_MOCK_EMBEDDING = [0.1, 0.2, 0.3, 0.4, 0.5]
+
+# Formatos tabulares: os chunks só são cortados entre linhas
+_TABLE_SUFFIXES = frozenset(('.csv', '.xlsx', '.xls'))
+
+# Tipos aceitos pelo Chroma sem conversão
+_SIMPLE_TYPES = frozenset((str, int, float, bool))
+
+def _filter_metadata(metadata, _simple=_SIMPLE_TYPES, _dumps=orjson.dumps, _opts=orjson.OPT_NON_STR_KEYS):
+    """Filtra metadados complexos para evitar erros no Chroma"""
+    # Caso comum: metadados já simples são devolvidos sem reconstruir o dicionário
+    if all(type(value) in _simple for value in metadata.values()):
+        return metadata
+    
+    filtered_metadata = {}
+    for key, value in metadata.items():
+        # Despacho pelo tipo exato: lookup em conjunto é mais barato que a cadeia de isinstance
+        value_type = type(value)
+        if value_type in _simple:
+            filtered_metadata[key] = value
+        elif value_type is dict:
+            # Para dicionários, converter para string JSON
+            try:
+                filtered_metadata[key] = _dumps(value, option=_opts).decode()
+            except TypeError:
+                filtered_metadata[key] = str(value)
+        else:
+            # Listas e outros tipos complexos viram string
+            filtered_metadata[key] = str(value)
+    return filtered_metadata
+
+class ParentRetriever(BaseRetriever):
+    """Busca pelos chunks filhos (pequenos) e devolve os chunks pais correspondentes"""
+    child_retriever: Any
+    parents: Dict[str, Document]
+    max_parents: int = 4
+    
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        results = []
+        seen = set()
+        for child in self.child_retriever.invoke(query):
+            parent_id = child.metadata.get("parent_id")
+            if parent_id in seen or parent_id not in self.parents:
+                continue
+            seen.add(parent_id)
+            results.append(self.parents[parent_id])
+            if len(results) >= self.max_parents:
+                break
+        return results
+
+class ParentChildStore:
+    """Vector store dos filhos com os pais em memória; as_retriever entrega os pais ao LLM"""
+    
+    def __init__(self, child_store, parents, child_k=12):
+        self.child_store = child_store
+        # Montado uma única vez: o pydantic copia o dicionário de pais, que fica só no retriever
+        self._retriever = ParentRetriever(
+            child_retriever=child_store.as_retriever(search_kwargs={"k": child_k}),
+            parents=parents
+        )
+    
+    @property
+    def parents(self):
+        return self._retriever.parents
+    
+    def as_retriever(self):
+        return self._retriever
+
 class DocumentProcessor:
+    # Número máximo de entradas no cache de loaders; as menos usadas recentemente são removidas
+    LOADER_CACHE_MAX_ENTRIES = 256
+    
+    # Textos enviados por chamada a embed_documents/add_documents (o Chroma limita o tamanho de cada lote)
+    EMBED_BATCH_SIZE = 512
+    
     def __init__(self):
         load_dotenv()
         self.groq_api_key = os.getenv("GROQ_API_KEY")
         
+        # Diretório onde as coleções do Chroma são persistidas entre execuções
+        self.chroma_dir = os.getenv("CHROMA_PERSIST_DIR", "./chroma")
+        
+        # Diretório do cache de documentos já carregados, indexado pelo hash do conteúdo
+        self.loader_cache_dir = os.getenv(
+            "LOADER_CACHE_DIR", os.path.expanduser("~/.cache/agente-ia/loader")
+        )
+        
         # Inicializar o text splitter
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
+        # Filhos menores de cada chunk: são eles que vão para o índice vetorial
+        self.child_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=400,
+            chunk_overlap=50,
+            length_function=len,
+        )
+        # Tabelas (CSV/planilhas) são divididas apenas em quebras de linha, sem cortar registros
+        self.table_splitter = RecursiveCharacterTextSplitter(
+            separators=["\n"],
+            chunk_size=1000,
+            chunk_overlap=0,
+            length_function=len,
+        )
         
         # Verificar se estamos em modo de produção ou desenvolvimento
         self.is_production = self.groq_api_key and self.groq_api_key != "your_groq_api_key"
@@ -38,10 +435,8 @@ class DocumentProcessor:
         # Inicializar embeddings - usamos HuggingFace em vez de OpenAI
         if self.is_production:
             try:
-                # Usar modelo de embedding gratuito do HuggingFace
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-mpnet-base-v2"
-                )
+                # Usar modelo de embedding gratuito do HuggingFace (compartilhado entre instâncias)
+                self.embeddings = _get_embedding_model("sentence-transformers/all-mpnet-base-v2")
                 print("Usando embeddings do HuggingFace em modo de produção")
             except Exception as e:
                 print(f"Erro ao inicializar embeddings de produção: {e}")
@@ -54,15 +449,20 @@ class DocumentProcessor:
         """Retorna embeddings simulados para desenvolvimento"""
         class MockEmbeddings:
             def embed_documents(self, texts):
-                # Retorna embeddings simulados (vetores de dimensão 5)
-                return [[0.1, 0.2, 0.3, 0.4, 0.5] for _ in texts]
+                # Retorna embeddings simulados (vetores de dimensão 5), todos o mesmo vetor compartilhado
+                return [_MOCK_EMBEDDING] * len(texts)
             
             def embed_query(self, text):
                 # Retorna embedding simulado para a query
-                return [0.1, 0.2, 0.3, 0.4, 0.5]
+                return _MOCK_EMBEDDING
         
         return MockEmbeddings()
     
+    @cached_property
+    def llm(self):
+        """LLM criado na primeira consulta e reutilizado (mantém o pool HTTP do cliente)"""
+        return self._get_groq_llm()
+    
     def _get_groq_llm(self):
         """Configura e retorna o LLM do GroqCloud"""
         if not self.is_production:
@@ -76,7 +476,9 @@ class DocumentProcessor:
             # Usar ChatGroq da langchain_groq
             llm = ChatGroq(
                 api_key=self.groq_api_key,
-                model="llama3-8b-8192"  # ou outro modelo disponível no GroqCloud
+                model="llama3-8b-8192",  # ou outro modelo disponível no GroqCloud
+                max_retries=2,
+                timeout=30
             )
             return llm
         except Exception as e:
@@ -87,49 +489,115 @@ class DocumentProcessor:
                     return f"Não foi possível conectar ao GroqCloud. Resposta simulada para: {prompt}"
             return FallbackMockLLM()
     
+    def _loader_cache_path(self, file_path):
+        """Calcula o caminho do cache do loader a partir do hash do conteúdo do arquivo"""
+        try:
+            file_hash = _file_hash(file_path)
+        except OSError as e:
+            print(f"Erro ao calcular hash do arquivo: {e}")
+            return None
+        
+        # A extensão faz parte da chave, pois define o loader usado
+        file_extension = os.path.splitext(file_path)[1].lower()
+        return os.path.join(self.loader_cache_dir, f"{file_hash}{file_extension}.pkl")
+    
+    def _read_loader_cache(self, cache_path):
+        """Lê do cache os documentos já carregados, ou None se não houver entrada"""
+        if not cache_path or not os.path.exists(cache_path):
+            return None
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                documents = pickle.load(f)
+            # Atualizar o mtime: a remoção de entradas antigas segue a ordem de uso
+            os.utime(cache_path)
+            print(f"Documento carregado do cache: {len(documents)} elementos")
+            return documents
+        except Exception as e:
+            print(f"Erro ao ler cache do documento: {e}")
+            return None
+    
     def load_document(self, file_path):
+        """Carrega um documento, reaproveitando o resultado em cache se o conteúdo já foi processado"""
+        cache_path = self._loader_cache_path(file_path)
+        
+        documents = self._read_loader_cache(cache_path)
+        if documents is not None:
+            return documents
+        
+        documents = self._load_document(file_path)
+        
+        if documents and cache_path:
+            self._write_loader_cache(cache_path, documents)
+        
+        return documents
+    
+    def _write_loader_cache(self, cache_path, documents):
+        """Grava a entrada do cache de forma atômica e remove as entradas excedentes"""
+        tmp_path = None
+        try:
+            os.makedirs(self.loader_cache_dir, exist_ok=True)
+            # Arquivo temporário exclusivo (seguro entre threads e processos), renomeado ao final
+            fd, tmp_path = tempfile.mkstemp(dir=self.loader_cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(documents, f, protocol=5)
+            os.replace(tmp_path, cache_path)
+            tmp_path = None
+        except Exception as e:
+            print(f"Erro ao gravar cache do documento: {e}")
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        
+        self._evict_loader_cache()
+    
+    def _evict_loader_cache(self):
+        """Mantém no cache apenas as LOADER_CACHE_MAX_ENTRIES entradas usadas mais recentemente"""
+        try:
+            entries = [entry for entry in os.scandir(self.loader_cache_dir) if entry.name.endswith(".pkl")]
+            if len(entries) <= self.LOADER_CACHE_MAX_ENTRIES:
+                return
+            
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.LOADER_CACHE_MAX_ENTRIES]:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Erro ao limpar cache do documento: {e}")
+    
+    def delete_loader_cache(self, content_hash):
+        """Remove as entradas do cache de um conteúdo (ex.: após excluir o documento)"""
+        if not content_hash or not os.path.isdir(self.loader_cache_dir):
+            return
+        
+        for entry in os.scandir(self.loader_cache_dir):
+            if entry.name.startswith(content_hash) and entry.name.endswith(".pkl"):
+                try:
+                    os.remove(entry.path)
+                except OSError as e:
+                    print(f"Erro ao remover cache do documento: {e}")
+    
+    def _get_loader(self, file_path):
+        """Escolhe o loader com base na extensão do arquivo"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        loader_factory = _LOADERS.get(file_extension)
+        if loader_factory is None:
+            # Tentar usar um loader genérico para outros tipos
+            print(f"Tentando usar loader genérico para o formato: {file_extension}")
+            loader_factory = _generic_loader
+        
+        return loader_factory(file_path)
+    
+    def _load_document(self, file_path):
         """Carrega um documento com base em sua extensão"""
         file_extension = os.path.splitext(file_path)[1].lower()
         
         try:
-            # Loaders específicos para formatos comuns
-            if file_extension == '.txt':
-                loader = TextLoader(file_path)
-            elif file_extension == '.csv':
-                loader = CSVLoader(file_path)
-            elif file_extension == '.pdf':
-                loader = PyPDFLoader(file_path)
-            elif file_extension in ['.xlsx', '.xls']:
-                # Usar loader específico para Excel
-                loader = UnstructuredExcelLoader(file_path, mode="elements")
-            elif file_extension in ['.docx', '.doc']:
-                # Loader para documentos Word
-                loader = UnstructuredWordDocumentLoader(file_path)
-            elif file_extension == '.json':
-                # Definir uma função para extrair o conteúdo de cada item do JSON
-                def metadata_func(record, metadata):
-                    metadata["content"] = record.get("content", "")
-                    return metadata
-                
-                loader = JSONLoader(
-                    file_path=file_path,
-                    jq_schema='.[]',  # Ajuste conforme a estrutura do seu JSON
-                    content_key="content",  # Chave que contém o texto principal
-                    metadata_func=metadata_func
-                )
-            elif file_extension in ['.html', '.htm']:
-                loader = UnstructuredHTMLLoader(file_path)
-            elif file_extension == '.xml':
-                loader = UnstructuredXMLLoader(file_path)
-            elif file_extension in ['.eml', '.msg']:
-                loader = UnstructuredEmailLoader(file_path)
-            else:
-                # Tentar usar um loader genérico para outros tipos
-                print(f"Tentando usar loader genérico para o formato: {file_extension}")
-                loader = UnstructuredFileLoader(file_path)
-            
             # Carregar os documentos
-            documents = loader.load()
+            documents = self._get_loader(file_path).load()
             
             if not documents:
                 print(f"Aviso: Nenhum conteúdo extraído do arquivo {file_path}")
@@ -142,7 +610,7 @@ class DocumentProcessor:
             # Tentar usar o loader genérico como fallback
             try:
                 print("Tentando usar loader genérico como fallback...")
-                loader = UnstructuredFileLoader(file_path)
+                loader = _generic_loader(file_path)
                 return loader.load()
             except Exception as fallback_error:
                 print(f"Erro no fallback: {fallback_error}")
@@ -154,73 +622,132 @@ class DocumentProcessor:
         if not documents:
             return None
         
-        # Filtrar metadados complexos para evitar erros ao criar a vector store
+        return self._split_documents(documents, os.path.splitext(file_path)[1].lower())
+    
+    def process_document_stream(self, stream, suffix):
+        """Processa um documento a partir de um objeto de arquivo (ex.: SpooledTemporaryFile) e retorna os chunks"""
+        suffix = suffix.lower()
+        
+        loader_factory = _STREAM_LOADERS.get(suffix)
+        if loader_factory is not None:
+            # Os loaders podem ser geradores (ex.: PDF): a leitura acontece durante a divisão
+            try:
+                chunks = self._split_documents(loader_factory(stream), suffix)
+            except Exception as e:
+                print(f"Erro ao carregar documento a partir do stream ({suffix}): {e}")
+                chunks = None
+            
+            if chunks:
+                return chunks
+            stream.seek(0)
+        
+        # Demais formatos (ou falha acima): os loaders exigem um caminho no disco.
+        # O arquivo temporário é removido automaticamente ao sair do bloco.
+        with tempfile.NamedTemporaryFile(suffix=suffix) as tmp_file:
+            shutil.copyfileobj(stream, tmp_file, length=1024 * 1024)
+            tmp_file.flush()
+            return self.process_document(tmp_file.name)
+    
+    def _split_documents(self, documents, suffix=None):
+        """Filtra os metadados e divide os documentos (lista ou gerador) em chunks conforme o formato"""
+        # Seções de Markdown/HTML já chegam separadas e só são subdivididas quando passam do tamanho do chunk
+        splitter = self.table_splitter if suffix in _TABLE_SUFFIXES else self.text_splitter
+        
+        # Um documento por vez: com geradores, o texto de cada página é liberado após a divisão
+        chunks = []
         for doc in documents:
+            # Filtrar metadados complexos para evitar erros ao criar a vector store
             if hasattr(doc, 'metadata'):
-                doc.metadata = self._filter_metadata(doc.metadata)
-        
-        # Dividir documentos em chunks
-        chunks = self.text_splitter.split_documents(documents)
+                doc.metadata = _filter_metadata(doc.metadata)
+            chunks.extend(splitter.split_documents([doc]))
         return chunks
     
-    def _filter_metadata(self, metadata):
-        """Filtra metadados complexos para evitar erros no Chroma"""
-        filtered_metadata = {}
-        for key, value in metadata.items():
-            # Aceitar apenas tipos simples: str, int, float, bool
-            if isinstance(value, (str, int, float, bool)):
-                filtered_metadata[key] = value
-            elif isinstance(value, list):
-                # Para listas, converter para string
-                filtered_metadata[key] = str(value)
-            elif isinstance(value, dict):
-                # Para dicionários, converter para string JSON
-                try:
-                    filtered_metadata[key] = json.dumps(value)
-                except:
-                    filtered_metadata[key] = str(value)
-            else:
-                # Para outros tipos complexos, converter para string
-                filtered_metadata[key] = str(value)
-        return filtered_metadata
-    
     def create_vector_store(self, chunks, collection_name="document_collection"):
-        """Cria uma vector store a partir dos chunks"""
+        """Cria uma vector store a partir dos chunks (None se a criação falhar em produção)"""
         if not chunks:
             print("Aviso: Nenhum chunk fornecido para criar a vector store")
             return self._create_mock_vector_store([], collection_name)
         
-        # Filtrar metadados complexos de todos os chunks
-        filtered_chunks = []
-        for chunk in chunks:
-            # Converter para Document se não for
-            if not isinstance(chunk, Document):
-                chunk_doc = Document(
+        # Os chunks de uma coleção têm todos o mesmo tipo: verificar os atributos uma única vez
+        first = chunks[0]
+        if hasattr(first, 'page_content') and hasattr(first, 'metadata'):
+            filtered_chunks = [
+                Document(page_content=chunk.page_content, metadata=_filter_metadata(chunk.metadata))
+                for chunk in chunks
+            ]
+        else:
+            filtered_chunks = [
+                Document(
                     page_content=chunk.page_content if hasattr(chunk, 'page_content') else str(chunk),
-                    metadata=self._filter_metadata(chunk.metadata) if hasattr(chunk, 'metadata') else {}
+                    metadata=_filter_metadata(chunk.metadata) if hasattr(chunk, 'metadata') else {}
                 )
-                filtered_chunks.append(chunk_doc)
-            else:
-                # Filtrar metadados complexos
-                chunk.metadata = self._filter_metadata(chunk.metadata)
-                filtered_chunks.append(chunk)
+                for chunk in chunks
+            ]
         
         if self.is_production and filtered_chunks:
             try:
-                # Usar Chroma como vector store
-                vector_store = Chroma.from_documents(
-                    documents=filtered_chunks, 
-                    embedding=self.embeddings,
-                    collection_name=collection_name
+                # Usar Chroma persistente: a coleção é reaberta e só recebe chunks novos
+                vector_store = Chroma(
+                    collection_name=collection_name,
+                    embedding_function=self.embeddings,
+                    persist_directory=os.path.join(self.chroma_dir, collection_name),
+                    collection_metadata={"hnsw:space": "cosine", "hnsw:M": 32, "hnsw:construction_ef": 200}
                 )
-                print(f"Vector store criada com {len(filtered_chunks)} chunks")
-                return vector_store
+                
+                # IDs derivados do conteúdo; chunks repetidos colapsam no mesmo ID
+                parents = {}
+                for chunk in filtered_chunks:
+                    parent_id = hashlib.blake2b(chunk.page_content.encode("utf-8"), digest_size=16).hexdigest()
+                    parents.setdefault(parent_id, chunk)
+                
+                # Só os filhos são embedados; cada um aponta para o pai pelo parent_id
+                children_by_id = {}
+                for parent_id, parent in parents.items():
+                    for n, child_text in enumerate(self.child_splitter.split_text(parent.page_content)):
+                        children_by_id[f"{parent_id}:{n}"] = Document(
+                            page_content=child_text,
+                            metadata={**parent.metadata, "parent_id": parent_id}
+                        )
+                
+                existing_ids = set(vector_store.get(include=[])["ids"])
+                
+                # Remover filhos que não fazem mais parte do conjunto (ex.: documentos excluídos)
+                stale_ids = list(existing_ids - children_by_id.keys())
+                if stale_ids:
+                    vector_store.delete(ids=stale_ids)
+                
+                # Embedar apenas o que ainda não está indexado
+                new_ids = [child_id for child_id in children_by_id if child_id not in existing_ids]
+                # Cada lote é embedado numa única chamada ao modelo
+                for start in range(0, len(new_ids), self.EMBED_BATCH_SIZE):
+                    batch_ids = new_ids[start:start + self.EMBED_BATCH_SIZE]
+                    vector_store.add_documents([children_by_id[child_id] for child_id in batch_ids], ids=batch_ids)
+                
+                print(f"Vector store pronta com {len(parents)} chunks e {len(children_by_id)} filhos ({len(new_ids)} novos)")
+                return ParentChildStore(vector_store, parents)
             except Exception as e:
                 print(f"Erro ao criar vector store: {e}")
-                return self._create_mock_vector_store(filtered_chunks, collection_name)
+                return None
         else:
             return self._create_mock_vector_store(filtered_chunks, collection_name)
     
+    def delete_vector_store(self, collection_name):
+        """Remove a coleção persistente (índice e diretório no disco), ex.: de um documento excluído"""
+        persist_directory = os.path.join(self.chroma_dir, collection_name)
+        if not os.path.isdir(persist_directory):
+            return
+        
+        try:
+            Chroma(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                persist_directory=persist_directory
+            ).delete_collection()
+        except Exception as e:
+            print(f"Erro ao excluir coleção {collection_name}: {e}")
+        
+        shutil.rmtree(persist_directory, ignore_errors=True)
+    
     def _create_mock_vector_store(self, chunks, collection_name):
         """Cria uma vector store simulada para desenvolvimento"""
         print(f"Simulando criação de vector store com {len(chunks)} chunks")
@@ -255,8 +782,8 @@ class DocumentProcessor:
         
         if self.is_production:
             try:
-                # Configurar LLM do GroqCloud
-                llm = self._get_groq_llm()
+                # Reutilizar o LLM do GroqCloud já configurado
+                llm = self.llm
                 
                 # Criar chain para consulta de documentos
                 qa_chain = RetrievalQA.from_chain_type(
@@ -330,4 +857,4 @@ class DocumentProcessor:
                 return [[0.0] * 5 for _ in texts]  # Fallback para embeddings vazios
         else:
             # Retornar embeddings simulados
-            return [[0.1, 0.2, 0.3, 0.4, 0.5] for _ in texts]
\ No newline at end of file
+            return [_MOCK_EMBEDDING] * len(texts)
\ No newline at end of file
@@ -1,67 +1,206 @@
 import streamlit as st
 import os
-import tempfile
-from document_processor import DocumentProcessor
-from database_manager import DatabaseManager
-import pandas as pd
+import gc
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Inicializar processador de documentos e gerenciador de banco de dados
-document_processor = DocumentProcessor()
-db_manager = DatabaseManager()
+# Tipos de arquivo aceitos no upload
+SUPPORTED_TYPES = ("txt", "md", "csv", "pdf", "xlsx", "xls", "docx", "doc", "json", "html", "htm", "xml", "eml", "msg")
 
-# Inicializar banco de dados
-db_manager.initialize_database()
+# Número máximo de arquivos processados em paralelo no upload
+MAX_UPLOAD_WORKERS = int(os.getenv("MAX_UPLOAD_WORKERS", "8"))
 
-# Configuração para o tema (dark/light mode)
-def set_theme():
-    # Inicializar o state do tema se não existir
-    if 'theme' not in st.session_state:
-        st.session_state.theme = "dark"
+# Processador de documentos e gerenciador de banco de dados são criados uma única vez
+# por processo e compartilhados entre sessões e reruns. Os módulos (LangChain, psycopg2)
+# só são importados no primeiro uso, para não pesar na inicialização.
+@st.cache_resource
+def get_doc_processor():
+    from document_processor import DocumentProcessor
+    return DocumentProcessor()
+
+@st.cache_resource
+def get_db():
+    from database_manager import DatabaseManager
+    return DatabaseManager()
+
+@st.cache_resource
+def init_database():
+    """Executa o DDL uma única vez por processo (chamado no início de main).
+    
+    Em caso de falha levanta exceção: o cache_resource não guarda exceções, então
+    o próximo rerun tenta de novo (o DatabaseManager recria o pool se preciso).
+    """
+    if not get_db().initialize_database():
+        raise ConnectionError("Não foi possível inicializar o banco de dados.")
+    return True
+
+@st.cache_resource(ttl=3600, max_entries=1)
+def build_global_store(fingerprint):
+    """Monta a vector store de todos os documentos; o fingerprint (IDs e datas de upload) é a chave do cache"""
+    db_manager = get_db()
+    
+    # Recuperar todos os chunks de todos os documentos numa única consulta
+    rows = db_manager.get_all_chunks_with_docinfo()
+    if rows is None:
+        raise ConnectionError("Não foi possível recuperar os chunks do banco de dados.")
+    all_chunks = []
+    
+    # jsonb já chega como dict pelo psycopg2; decodificar apenas se a coluna vier como texto
+    metadata_is_text = bool(rows) and isinstance(rows[0].get("metadata"), (str, bytes))
+    
+    for chunk in rows:
+        chunk_metadata = chunk.get("metadata") or {}
+        if metadata_is_text:
+            try:
+                chunk_metadata = orjson.loads(chunk_metadata)
+            except orjson.JSONDecodeError:
+                chunk_metadata = {}
+    
+        # Certificar-se de que chunk_metadata é um dicionário
+        if not isinstance(chunk_metadata, dict):
+            chunk_metadata = {}
     
-    # Definir cores com base no tema atual
-    if st.session_state.theme == "dark":
-        primary_color = "#4F6D7A"
-        background_color = "#282C34"
-        text_color = "#FFFFFF"
-        secondary_background = "#3E4451"
-    else:  # Light mode
-        primary_color = "#4F6D7A"
-        background_color = "#FFFFFF"
-        text_color = "#1E1E1E"
-        secondary_background = "#F0F2F6"
-    
-    # Aplicar CSS personalizado
-    st.markdown(f"""
+        # Adicionar informação do documento de origem ao metadado do chunk
+        chunk_metadata = {
+            **chunk_metadata,
+            "document_id": chunk["document_id"],
+            "document_name": chunk["document_name"]
+        }
+    
+        # Criar objeto de chunk para processamento
+        all_chunks.append(
+            type('obj', (object,), {
+                'page_content': chunk["chunk_text"],
+                'metadata': chunk_metadata
+            })
+        )
+    
+    if not all_chunks:
+        raise LookupError("Nenhum chunk encontrado para pesquisa.")
+    
+    # Criar vector store combinada para todos os chunks
+    vector_store = get_doc_processor().create_vector_store(all_chunks, collection_name="global_search")
+    
+    # Cada chunk gerou uma classe via type(), o que forma ciclos de referência;
+    # coletar agora em vez de esperar a geração mais antiga do GC
+    del all_chunks
+    gc.collect()
+    
+    if vector_store is None:
+        raise RuntimeError("Não foi possível criar a vector store global.")
+    return vector_store
+
+@st.cache_resource(ttl=3600, max_entries=8)
+def build_document_store(doc_id):
+    """Abre a vector store de um documento uma única vez; consultas seguintes só embedam a pergunta"""
+    chunks = cached_chunks(doc_id)
+    if not chunks:
+        raise LookupError(f"Nenhum chunk encontrado para o documento {doc_id}.")
+    
+    vector_store = get_doc_processor().create_vector_store([
+        type('obj', (object,), {
+            'page_content': chunk["chunk_text"],
+            'metadata': chunk.get("metadata", {})
+        }) for chunk in chunks
+    ], collection_name=f"document_{doc_id}")
+    if vector_store is None:
+        raise RuntimeError(f"Não foi possível criar a vector store do documento {doc_id}.")
+    return vector_store
+
+# Número de documentos exibidos por página em "Visualizar Documentos"
+# (padrão e opções oferecidas ao usuário)
+DOCUMENTS_PAGE_SIZE = 50
+DOCUMENTS_PAGE_SIZES = (25, 50, 100, 200)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_documents_page(page_num, page_size=DOCUMENTS_PAGE_SIZE):
+    """Busca uma página de documentos e o total numa só consulta (fica em cache por 30s)"""
+    return get_db().list_documents_page(limit=page_size, offset=(page_num - 1) * page_size)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_all_documents():
+    """Lista completa de documentos, usada nos seletores da página de consulta"""
+    return get_db().list_documents()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_chunks(doc_id):
+    """Chunks de um documento; não mudam após o upload, então ficam em cache por 5 min"""
+    chunks = get_db().get_document_chunks(doc_id)
+    # st.cache_data não guarda exceções: uma falha do banco não fica em cache
+    if chunks is None:
+        raise ConnectionError(f"Não foi possível recuperar os chunks do documento {doc_id}.")
+    return chunks
+
+def document_labels(documents):
+    """Rótulos dos seletores de documento, montados uma vez por lista (ID -> "ID: x - nome")"""
+    return {doc["id"]: f"ID: {doc['id']} - {doc['filename']}" for doc in documents}
+
+def clear_document_caches():
+    """Invalida as listagens em cache após inserir ou excluir documentos"""
+    get_documents_page.clear()
+    get_all_documents.clear()
+
+# Paletas de cores de cada tema
+THEME_COLORS = {
+    "dark": {
+        "primary_color": "#4F6D7A",
+        "background_color": "#282C34",
+        "text_color": "#FFFFFF",
+        "secondary_background": "#3E4451",
+    },
+    "light": {
+        "primary_color": "#4F6D7A",
+        "background_color": "#FFFFFF",
+        "text_color": "#1E1E1E",
+        "secondary_background": "#F0F2F6",
+    },
+}
+
+# CSS de cada tema, montado uma única vez na importação do módulo
+THEME_CSS = {
+    theme: f"""
     <style>
         .stApp {{
-            background-color: {background_color};
-            color: {text_color};
+            background-color: {colors["background_color"]};
+            color: {colors["text_color"]};
         }}
         .stSidebar .sidebar-content {{
-            background-color: {secondary_background};
+            background-color: {colors["secondary_background"]};
         }}
         h1, h2, h3, h4, h5, h6, p, .stMarkdown {{
-            color: {text_color} !important;
+            color: {colors["text_color"]} !important;
         }}
         .stButton>button {{
-            background-color: {primary_color};
+            background-color: {colors["primary_color"]};
             color: white;
         }}
         .stDataFrame {{
-            background-color: {secondary_background};
+            background-color: {colors["secondary_background"]};
         }}
         .st-emotion-cache-ue6h4q {{
-            color: {text_color};
+            color: {colors["text_color"]};
         }}
         .stExpander {{
-            background-color: {secondary_background};
+            background-color: {colors["secondary_background"]};
         }}
     </style>
-    """, unsafe_allow_html=True)
+    """
+    for theme, colors in THEME_COLORS.items()
+}
+
+# Configuração para o tema (dark/light mode)
+def set_theme():
+    # Inicializar o state do tema se não existir
+    if 'theme' not in st.session_state:
+        st.session_state.theme = "dark"
+    
+    # Aplicar CSS personalizado do tema atual
+    st.markdown(THEME_CSS[st.session_state.theme], unsafe_allow_html=True)
 
 def toggle_theme():
     if st.session_state.theme == "light":
@@ -80,6 +219,12 @@ def main():
     # Aplicar configurações de tema
     set_theme()
     
+    # Criar tabelas e índices; só o sucesso fica em cache, falhas são tentadas de novo no próximo rerun
+    try:
+        init_database()
+    except ConnectionError as e:
+        st.warning(str(e))
+    
     
     st.title("Agente LangChain - Processador de Arquivos")
     st.subheader("Armazenamento em PostgreSQL (Neon)")
@@ -104,6 +249,11 @@ def main():
         "Sobre o Agente"
     ])
     
+    # Resultados processados e não armazenados não sobrevivem à saída da página de upload
+    if page != "Upload de Arquivos" and st.session_state.get("upload_results") is not None:
+        st.session_state.upload_results = None
+        st.session_state.file_processed = False
+    
     # Exibir página selecionada
     if page == "Upload de Arquivos":
         upload_page()
@@ -114,92 +264,165 @@ def main():
     elif page == "Sobre o Agente":
         about_page()
 
+def upload_suffix(filename):
+    """Extensão já com o ponto; nomes sem extensão ou fora da lista caem em .bin"""
+    suffix = os.path.splitext(filename)[1].lower() or ".bin"
+    if suffix[1:] not in SUPPORTED_TYPES:
+        suffix = ".bin"
+    return suffix
+
 def upload_page():
+    document_processor = get_doc_processor()
+    db_manager = get_db()
+    
     st.header("Upload de Arquivos")
     st.write("Faça upload de arquivos para processamento e armazenamento no banco de dados.")
     
     # Adicionar state para controlar fluxo
     if 'file_processed' not in st.session_state:
         st.session_state.file_processed = False
-    if 'chunks' not in st.session_state:
-        st.session_state.chunks = None
-    
-    # Atualizar tipos de arquivo suportados
-    supported_types = ["txt", "csv", "pdf", "xlsx", "xls", "docx", "doc", "json", "html", "htm", "xml", "eml", "msg"]
-    uploaded_file = st.file_uploader("Escolha um arquivo", type=supported_types)
-    
-    if uploaded_file is not None:
-        # Exibir informações do arquivo
-        file_details = {
-            "Nome do arquivo": uploaded_file.name,
-            "Tipo de arquivo": uploaded_file.type,
-            "Tamanho": f"{uploaded_file.size} bytes"
-        }
-        
-        st.write("### Detalhes do Arquivo")
-        for key, value in file_details.items():
-            st.write(f"**{key}:** {value}")
-        
-        # Salvar arquivo temporariamente para processamento
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            temp_file_path = tmp_file.name
+    if 'upload_results' not in st.session_state:
+        # Lista com o resultado de cada arquivo processado (nome, hash, chunks e prévias)
+        st.session_state.upload_results = None
+    
+    uploaded_files = st.file_uploader("Escolha um ou mais arquivos", type=SUPPORTED_TYPES, accept_multiple_files=True)
+    
+    # Descartar chunks de uploads anteriores assim que a seleção de arquivos muda (ou é removida)
+    file_ids = tuple(getattr(uploaded_file, "file_id", uploaded_file.name) for uploaded_file in uploaded_files)
+    if file_ids != st.session_state.get("last_file_ids", ()):
+        st.session_state.last_file_ids = file_ids
+        st.session_state.file_processed = False
+        st.session_state.upload_results = None
+        st.session_state.duplicates = []
+        st.session_state.repeated = []
+    
+    if uploaded_files:
+        # Exibir informações dos arquivos
+        st.write("### Detalhes dos Arquivos")
+        for uploaded_file in uploaded_files:
+            st.write(f"**{uploaded_file.name}** ({uploaded_file.type}) - {uploaded_file.size} bytes")
         
-        # Função para processar o arquivo e armazenar resultado na session_state
-        def process_file():
-            with st.spinner("Processando arquivo..."):
-                try:
-                    # Processar documento
-                    st.session_state.chunks = document_processor.process_document(temp_file_path)
-                    if st.session_state.chunks:
-                        st.session_state.file_processed = True
-                    else:
-                        st.error("Não foi possível extrair conteúdo do arquivo.")
-                except Exception as e:
-                    st.error(f"Erro ao processar arquivo: {str(e)}")
-                finally:
-                    # Remover arquivo temporário
-                    if os.path.exists(temp_file_path):
-                        os.unlink(temp_file_path)
+        # Função para processar os arquivos e armazenar o resultado na session_state
+        def process_files():
+            with st.spinner("Processando arquivos..."):
+                results = []
+                duplicates = []
+                repeated = []
+                
+                pending = []
+                # Hash -> nome do primeiro arquivo selecionado com esse conteúdo
+                seen_hashes = {}
+                for uploaded_file in uploaded_files:
+                    # O upload já é um buffer em memória (BytesIO): hashear pela view, sem copiar os bytes
+                    with uploaded_file.getbuffer() as view:
+                        content_hash = hashlib.sha256(view).hexdigest()
+                    
+                    # Conteúdo idêntico já armazenado: não dividir nem embedar de novo
+                    existing_id = db_manager.find_document_by_hash(content_hash)
+                    if existing_id is not None:
+                        duplicates.append((uploaded_file.name, existing_id))
+                        continue
+                    
+                    # Mesmo conteúdo selecionado duas vezes: processar só a primeira cópia
+                    if content_hash in seen_hashes:
+                        repeated.append((uploaded_file.name, seen_hashes[content_hash]))
+                        continue
+                    seen_hashes[content_hash] = uploaded_file.name
+                    
+                    # Os loaders leem o próprio upload; só formatos sem leitor de stream vão para o disco
+                    uploaded_file.seek(0)
+                    pending.append((uploaded_file, content_hash))
+                
+                # Processar os arquivos em paralelo; chamadas ao Streamlit ficam na thread principal
+                with ThreadPoolExecutor(max_workers=max(1, min(MAX_UPLOAD_WORKERS, len(pending)))) as executor:
+                    futures = [
+                        executor.submit(document_processor.process_document_stream, uploaded_file, upload_suffix(uploaded_file.name))
+                        for uploaded_file, _ in pending
+                    ]
+                    
+                    for (uploaded_file, content_hash), future in zip(pending, futures):
+                        try:
+                            chunks = future.result()
+                        except Exception as e:
+                            st.error(f"Erro ao processar {uploaded_file.name}: {str(e)}")
+                            continue
+                        
+                        if not chunks:
+                            st.error(f"Não foi possível extrair conteúdo de {uploaded_file.name}.")
+                            continue
+                        
+                        results.append({
+                            "name": uploaded_file.name,
+                            "type": uploaded_file.type,
+                            "size": uploaded_file.size,
+                            "content_hash": content_hash,
+                            "chunks": chunks,
+                            # Prévias montadas uma única vez (apenas os 3 primeiros chunks)
+                            "previews": [
+                                chunk.page_content[:500] + "..." if len(chunk.page_content) > 500 else chunk.page_content
+                                for chunk in chunks[:3]
+                            ],
+                        })
+                
+                st.session_state.duplicates = duplicates
+                st.session_state.repeated = repeated
+                st.session_state.upload_results = results or None
+                st.session_state.file_processed = bool(results)
         
         # Botão para processar
         if not st.session_state.file_processed:
-            if st.button("Processar Arquivo"):
-                process_file()
+            if st.button("Processar Arquivos"):
+                process_files()
+        
+        for name, existing_id in st.session_state.get("duplicates", []):
+            st.info(f"O arquivo {name} já está armazenado no banco de dados (ID: {existing_id}).")
+        for name, first_name in st.session_state.get("repeated", []):
+            st.info(f"O arquivo {name} tem o mesmo conteúdo de {first_name}, selecionado mais de uma vez; apenas {first_name} foi processado.")
         
         # Mostrar resultados do processamento se já processado
-        if st.session_state.file_processed and st.session_state.chunks:
-            st.success(f"Arquivo processado com sucesso! Dividido em {len(st.session_state.chunks)} chunks.")
-            
-            # Mostrar prévia dos chunks
-            st.write("### Prévia dos Chunks")
-            for i, chunk in enumerate(st.session_state.chunks[:3]):  # Mostrar apenas os 3 primeiros chunks
-                with st.expander(f"Chunk {i+1}"):
-                    st.write(chunk.page_content[:500] + "..." if len(chunk.page_content) > 500 else chunk.page_content)
+        if st.session_state.file_processed and st.session_state.upload_results:
+            for result in st.session_state.upload_results:
+                st.success(f"{result['name']} processado com sucesso! Dividido em {len(result['chunks'])} chunks.")
+                
+                # Mostrar prévia dos chunks
+                st.write(f"### Prévia dos Chunks - {result['name']}")
+                for i, preview in enumerate(result["previews"]):
+                    with st.expander(f"Chunk {i+1}"):
+                        st.write(preview)
             
             # Função para armazenar no banco de dados
             def store_in_db():
-                # Armazenar documento
-                doc_id = db_manager.store_document(
-                    filename=uploaded_file.name,
-                    file_type=uploaded_file.type,
-                    file_size=uploaded_file.size,
-                    metadata={"source": "upload"}
-                )
-                
-                if doc_id:
-                    # Armazenar chunks
-                    success = db_manager.store_document_chunks(doc_id, st.session_state.chunks)
+                failed = []
+                for result in st.session_state.upload_results:
+                    # Armazenar documento e chunks numa única transação
+                    doc_id = db_manager.ingest(
+                        filename=result["name"],
+                        file_type=result["type"],
+                        file_size=result["size"],
+                        chunks=result["chunks"],
+                        metadata={"source": "upload"},
+                        content_hash=result["content_hash"]
+                    )
                     
-                    if success:
-                        st.success(f"Documento armazenado com sucesso! ID: {doc_id}")
-                        # Resetar o estado para permitir novo processamento
-                        st.session_state.file_processed = False
-                        st.session_state.chunks = None
-                    else:
-                        st.error("Erro ao armazenar chunks do documento.")
-                else:
-                    st.error("Erro ao armazenar documento no banco de dados.")
+                    if not doc_id:
+                        st.error(f"Erro ao armazenar {result['name']} no banco de dados.")
+                        failed.append(result)
+                        continue
+                    
+                    # Indexar já no armazenamento: a coleção persistente fica pronta para as consultas
+                    with st.spinner(f"Indexando {result['name']} para consultas..."):
+                        vector_store = document_processor.create_vector_store(result["chunks"], collection_name=f"document_{doc_id}")
+                    if vector_store is None:
+                        st.warning(f"Não foi possível indexar {result['name']} agora; a indexação será refeita na primeira consulta.")
+                    
+                    st.success(f"Documento {result['name']} armazenado com sucesso! ID: {doc_id}")
+                
+                if len(failed) < len(st.session_state.upload_results):
+                    clear_document_caches()
+                
+                # Manter apenas os arquivos que falharam, para permitir nova tentativa
+                st.session_state.upload_results = failed or None
+                st.session_state.file_processed = bool(failed)
             
             # Botão para armazenar
             if st.button("Armazenar no Banco de Dados"):
@@ -207,60 +430,112 @@ def upload_page():
 
 
 def view_documents_page():
+    # pandas só é necessário nesta página
+    import pandas as pd
+    
+    db_manager = get_db()
+    
     st.header("Visualizar Documentos")
     st.write("Visualize os documentos armazenados no banco de dados.")
     
-    # Listar documentos
-    documents = db_manager.list_documents()
+    # Resultado da última exclusão (gravado pelo callback do botão)
+    delete_message = st.session_state.pop("delete_message", None)
+    if delete_message:
+        level, text = delete_message
+        if level == "success":
+            st.success(text)
+        else:
+            st.error(text)
     
-    if not documents:
+    # Tamanho e número da página (estado dos widgets abaixo) definem o LIMIT/OFFSET da consulta.
+    # A chave do número inclui o tamanho: trocá-lo volta para a primeira página.
+    page_size = st.session_state.setdefault("documents_page_size", DOCUMENTS_PAGE_SIZE)
+    page_key = f"documents_page_{page_size}"
+    page_num = int(st.session_state.get(page_key, 1))
+    
+    # Página atual e total de documentos numa única ida ao banco
+    documents, total_documents = get_documents_page(page_num, page_size)
+    
+    if not total_documents:
         st.info("Nenhum documento encontrado no banco de dados.")
     else:
-        # Criar DataFrame para exibição
-        df_data = []
-        for doc in documents:
-            df_data.append({
-                "ID": doc["id"],
-                "Nome do Arquivo": doc["filename"],
-                "Tipo": doc["file_type"],
-                "Tamanho (bytes)": doc["file_size"],
-                "Data de Upload": doc["upload_date"]
-            })
+        total_pages = max(1, -(-total_documents // page_size))
+        if page_num > total_pages:
+            # A página deixou de existir (ex.: após exclusões): ir para a última
+            page_num = total_pages
+            st.session_state[page_key] = page_num
+            documents, _ = get_documents_page(page_num, page_size)
+        
+        page_col, size_col = st.columns([3, 1])
+        size_col.selectbox("Documentos por página", DOCUMENTS_PAGE_SIZES, key="documents_page_size")
+        page_col.number_input(
+            f"Página (de {total_pages})", min_value=1, max_value=total_pages, step=1, key=page_key
+        )
         
-        df = pd.DataFrame(df_data)
+        # Criar DataFrame direto dos registros do banco, com tipos declarados
+        df = pd.DataFrame.from_records(
+            documents, columns=["id", "filename", "file_type", "file_size", "upload_date"]
+        ).astype({"file_size": "Int64"})
+        df["upload_date"] = pd.to_datetime(df["upload_date"])
+        df = df.rename(columns={
+            "id": "ID",
+            "filename": "Nome do Arquivo",
+            "file_type": "Tipo",
+            "file_size": "Tamanho (bytes)",
+            "upload_date": "Data de Upload"
+        })
         st.dataframe(df)
         
         # Selecionar documento para visualizar chunks
         if documents:
+            labels = document_labels(documents)
             doc_id = st.selectbox("Selecione um documento para visualizar os chunks", 
-                                 options=[doc["id"] for doc in documents],
-                                 format_func=lambda x: f"ID: {x} - {next((doc['filename'] for doc in documents if doc['id'] == x), '')}")
+                                 options=list(labels),
+                                 format_func=labels.__getitem__)
             
             if st.button("Visualizar Chunks"):
-                chunks = db_manager.get_document_chunks(doc_id)
-                
-                if not chunks:
-                    st.info("Nenhum chunk encontrado para este documento.")
+                try:
+                    chunks = cached_chunks(doc_id)
+                except Exception as e:
+                    st.error(f"Erro ao recuperar chunks do documento: {str(e)}")
                 else:
-                    st.write(f"### Chunks do Documento (Total: {len(chunks)})")
-                    for chunk in chunks:
-                        with st.expander(f"Chunk {chunk['chunk_index'] + 1}"):
-                            st.write(chunk["chunk_text"])
+                    if not chunks:
+                        st.info("Nenhum chunk encontrado para este documento.")
+                    else:
+                        st.write(f"### Chunks do Documento (Total: {len(chunks)})")
+                        for chunk in chunks:
+                            with st.expander(f"Chunk {chunk['chunk_index'] + 1}"):
+                                st.write(chunk["chunk_text"])
             
-            # Opção para excluir documento
-            if st.button("Excluir Documento", key="delete_btn"):
+            # Callback executado antes do rerun do clique: a página já é montada sem o documento
+            # excluído, sem precisar de um st.rerun() adicional
+            def delete_document(doc_id):
+                # Hash do conteúdo, para remover também o cache de loaders do documento
+                document = db_manager.get_document(doc_id)
                 if db_manager.delete_document(doc_id):
-                    st.success(f"Documento ID {doc_id} excluído com sucesso!")
-                    st.rerun()  # Recarregar a página
+                    clear_document_caches()
+                    cached_chunks.clear()
+                    build_document_store.clear()
+                    # Remover também o índice persistente (texto e embeddings) do documento
+                    get_doc_processor().delete_vector_store(f"document_{doc_id}")
+                    if document:
+                        get_doc_processor().delete_loader_cache(document.get("content_hash"))
+                    st.session_state.delete_message = ("success", f"Documento ID {doc_id} excluído com sucesso!")
                 else:
-                    st.error("Erro ao excluir documento.")
+                    st.session_state.delete_message = ("error", "Erro ao excluir documento.")
+            
+            # Opção para excluir documento
+            st.button("Excluir Documento", key="delete_btn", on_click=delete_document, args=(doc_id,))
 
 def query_documents_page():
+    document_processor = get_doc_processor()
+    db_manager = get_db()
+    
     st.header("Consultar Documentos")
     st.write("Faça consultas nos documentos armazenados usando LangChain.")
     
-    # Listar documentos
-    documents = db_manager.list_documents()
+    # Listar documentos (em cache; digitar a consulta não refaz a listagem no banco)
+    documents = get_all_documents()
     
     if not documents:
         st.info("Nenhum documento encontrado no banco de dados para consulta.")
@@ -272,29 +547,26 @@ def query_documents_page():
     # Aba de consulta específica
     with query_tab:
         # Selecionar documento para consulta
+        labels = document_labels(documents)
         doc_id = st.selectbox("Selecione um documento para consultar", 
-                             options=[doc["id"] for doc in documents],
-                             format_func=lambda x: f"ID: {x} - {next((doc['filename'] for doc in documents if doc['id'] == x), '')}")
+                             options=list(labels),
+                             format_func=labels.__getitem__)
         
         # Campo de consulta
         query = st.text_input("Digite sua consulta:", key="specific_query")
         
         if query and st.button("Consultar Documento"):
             with st.spinner("Processando consulta..."):
-                # Recuperar chunks do documento selecionado
-                chunks = db_manager.get_document_chunks(doc_id)
+                # Vector store do documento, reaproveitada entre consultas
+                try:
+                    vector_store = build_document_store(doc_id)
+                except Exception as e:
+                    print(f"Erro ao montar vector store do documento {doc_id}: {e}")
+                    vector_store = None
                 
-                if chunks:
-                    # Criar vector store para consulta
-                    mock_vector_store = document_processor.create_vector_store([
-                        type('obj', (object,), {
-                            'page_content': chunk["chunk_text"],
-                            'metadata': chunk.get("metadata", {})
-                        }) for chunk in chunks
-                    ])
-                    
+                if vector_store is not None:
                     # Realizar consulta
-                    result = document_processor.query_document(query, mock_vector_store)
+                    result = document_processor.query_document(query, vector_store)
                     
                     # Armazenar consulta no banco de dados
                     db_manager.store_query(query, doc_id, result)
@@ -315,45 +587,15 @@ def query_documents_page():
         
         if global_query and st.button("Pesquisar em Todos os Documentos"):
             with st.spinner("Pesquisando em todos os documentos..."):
-                # Recuperar todos os chunks de todos os documentos
-                all_chunks = []
-                document_map = {}  # Mapeamento de IDs para nomes de documentos
-                
-                for doc in documents:
-                    document_map[doc["id"]] = doc["filename"]
-                    chunks = db_manager.get_document_chunks(doc["id"])
-                    
-                    if chunks:
-                        for chunk in chunks:
-                            # Adicionar informação do documento de origem ao metadado do chunk
-                            chunk_metadata = chunk.get("metadata", {})
-                            if isinstance(chunk_metadata, str):
-                                try:
-                                    chunk_metadata = json.loads(chunk_metadata)
-                                except:
-                                    chunk_metadata = {}
-                            
-                            # Certificar-se de que chunk_metadata é um dicionário
-                            if not isinstance(chunk_metadata, dict):
-                                chunk_metadata = {}
-                                
-                            chunk_metadata["document_id"] = doc["id"]
-                            chunk_metadata["document_name"] = doc["filename"]
-                            
-                            # Criar objeto de chunk para processamento
-                            all_chunks.append(
-                                type('obj', (object,), {
-                                    'page_content': chunk["chunk_text"],
-                                    'metadata': chunk_metadata
-                                })
-                            )
+                # Vector store reaproveitada enquanto o conjunto de documentos não mudar
+                fingerprint = tuple((doc["id"], doc.get("upload_date")) for doc in documents)
+                try:
+                    combined_vector_store = build_global_store(fingerprint)
+                except Exception as e:
+                    print(f"Erro ao montar vector store global: {e}")
+                    combined_vector_store = None
                 
-                if all_chunks:
-                    # Criar vector store combinada para todos os chunks
-                    combined_vector_store = document_processor.create_vector_store(
-                        all_chunks, collection_name="global_search"
-                    )
-                    
+                if combined_vector_store is not None:
                     # Realizar consulta em todos os chunks
                     result = document_processor.query_document(global_query, combined_vector_store)
                     
@@ -366,11 +608,8 @@ def query_documents_page():
                 else:
                     st.error("Não foi possível recuperar chunks para pesquisa.")
 
-def about_page():
-    st.header("Sobre o Agente LangChain")
-    
-    # Mostrar informações sobre a aplicação com estilo adequado ao tema
-    about_content = """
+# Texto da página "Sobre" (constante de módulo, criada uma única vez)
+ABOUT_MARKDOWN = """
     ### Descrição
     Este é um agente desenvolvido com Python e LangChain para processamento de arquivos e armazenamento em banco de dados PostgreSQL (Neon).
     
@@ -393,8 +632,12 @@ def about_page():
     ### Modo de Desenvolvimento
     Este agente está configurado para funcionar em modo simulado, permitindo o desenvolvimento e teste sem necessidade de credenciais reais de banco de dados ou API.
     """
+
+def about_page():
+    st.header("Sobre o Agente LangChain")
     
-    st.markdown(about_content)
+    # Mostrar informações sobre a aplicação com estilo adequado ao tema
+    st.markdown(ABOUT_MARKDOWN)
 
 if __name__ == "__main__":
     main()